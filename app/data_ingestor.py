@@ -1,4 +1,16 @@
+import os
+import tempfile
+from functools import lru_cache
+
+import numpy
 import pandas
+import pyarrow
+import pyarrow.parquet
+
+# Bump whenever cleaning, dtypes or row order change, so existing Parquet caches are
+# rebuilt instead of silently serving data in the old layout
+PARQUET_CACHE_VERSION = 3
+PARQUET_CACHE_METADATA_KEY = b'data_ingestor_cache'
 
 class DataIngestor:
     """
@@ -15,44 +27,222 @@ class DataIngestor:
             csv_path: Path to CSV file containing survey data
         """
         # Questions where lower values are better
-        self.questions_best_is_min = [
+        self.questions_best_is_min = frozenset([
             'Percent of adults aged 18 years and older who have an overweight classification',
             'Percent of adults aged 18 years and older who have obesity',
             'Percent of adults who engage in no leisure-time physical activity',
             'Percent of adults who report consuming fruit less than one time daily',
             'Percent of adults who report consuming vegetables less than one time daily'
-        ]
+        ])
 
-        self.questions_best_is_max = [
+        self.questions_best_is_max = frozenset([
             'Percent of adults who achieve at least 150 minutes a week of moderate-intensity aerobic physical activity or 75 minutes a week of vigorous-intensity aerobic activity (or an equivalent combination)',
             'Percent of adults who achieve at least 150 minutes a week of moderate-intensity aerobic physical activity or 75 minutes a week of vigorous-intensity aerobic physical activity and engage in muscle-strengthening activities on 2 or more days a week',
             'Percent of adults who achieve at least 300 minutes a week of moderate-intensity aerobic physical activity or 150 minutes a week of vigorous-intensity aerobic activity (or an equivalent combination)',
             'Percent of adults who engage in muscle-strengthening activities on 2 or more days a week',
-        ]
+        ])
 
 
+        # Low-cardinality text columns stored as categories, so masks and
+        # groupbys work on integer codes instead of Python strings
+        self.categorical_columns = [
+            'LocationDesc', 'StratificationCategory1', 'Stratification1'
+        ]
+
         self.csv_path = csv_path
+        # Cleaned dataset cached in columnar form, so later starts skip CSV parsing
+        self.parquet_path = csv_path + '.parquet'
         self.data_set = self._load_dataset_with_validation()
 
+        # Per-question and per-(question, state) subsets, built once so that
+        # requests do not rescan the whole table with a boolean mask. The
+        # dataset is sorted by both keys, so every subset is a slice view
+        self._by_question = self._contiguous_groups(self.data_set, 'Question')
+        self._by_question_state = {
+            (question, state): state_rows
+            for question, question_rows in self._by_question.items()
+            for state, state_rows in self._contiguous_groups(
+                question_rows, 'LocationDesc'
+            ).items()
+        }
+        self._empty_subset = self.data_set.iloc[:0]
+
     def _load_dataset_with_validation(self):
         """
-        Load and validate dataset structure.
+        Load and validate dataset structure, keeping only rows from the
+        2011-2022 timeframe with a numeric Data_Value. The result is
+        cached next to the CSV as Parquet and reused while its tag still
+        matches the CSV and the cache format.
         
         Returns:
-            pandas.DataFrame: Loaded dataset
+            pandas.DataFrame: Loaded and cleaned dataset, sorted by
+            Question and LocationDesc
             
         Raises:
             ValueError: If required columns are missing
         """
-        dataset = pandas.read_csv(self.csv_path)
+        cache_tag = self._parquet_cache_tag()
+        if cache_tag is not None:
+            cached = self._read_parquet_cache(cache_tag)
+            if cached is not None:
+                return cached
+
+        dataset = pandas.read_csv(
+            self.csv_path,
+            engine='pyarrow',
+            dtype={column: 'category' for column in self.categorical_columns}
+        )
         required_columns = {'Question', 'YearStart', 'YearEnd', 'LocationDesc', 'Data_Value'}
         if not required_columns.issubset(dataset.columns):
             raise ValueError("CSV file missing required columns")
+        dataset['Question'] = dataset['Question'].astype('category')
+
+        # Clean once here so the request path only aggregates
+        dataset = self._apply_temporal_filters(dataset)
+        dataset = self._convert_to_numeric_values(dataset)
+
+        # Stable sort keeps the original row order inside each group. Rows
+        # missing a Question or LocationDesc (code -1) go first, so they
+        # stay before code 0 and outside every slice _contiguous_groups cuts
+        dataset = dataset.sort_values(
+            ['Question', 'LocationDesc'], kind='stable', na_position='first'
+        )
+
+        if cache_tag is not None:
+            self._write_parquet_cache(dataset, cache_tag)
+        return dataset
+
+    def _parquet_cache_tag(self):
+        """
+        Describe the CSV and the cache format the Parquet copy must match.
+
+        Returns:
+            bytes: Serialized tag, or None if the CSV cannot be stat-ed
+        """
+        try:
+            csv_stat = os.stat(self.csv_path)
+        except OSError:
+            return None
+        return (
+            f'{PARQUET_CACHE_VERSION}:{csv_stat.st_size}:{csv_stat.st_mtime_ns}'
+        ).encode()
+
+    def _read_parquet_cache(self, cache_tag):
+        """
+        Load the Parquet copy of the dataset if it can be trusted.
+
+        Args:
+            cache_tag: Tag the cache must have been written with
+
+        Returns:
+            pandas.DataFrame: Cached dataset, or None if the cache is
+            missing, unreadable, stale or not in the expected layout
+        """
+        try:
+            table = pyarrow.parquet.read_table(self.parquet_path, memory_map=True)
+            if (table.schema.metadata or {}).get(PARQUET_CACHE_METADATA_KEY) != cache_tag:
+                return None
+            dataset = table.to_pandas()
+        except (OSError, ValueError, pyarrow.ArrowException):
+            return None  # Partial or corrupt file; parse the CSV instead
+
+        expected_dtypes = {column: 'category' for column in self.categorical_columns}
+        expected_dtypes.update({'Question': 'category', 'Data_Value': 'float32'})
+        for column, dtype in expected_dtypes.items():
+            if column not in dataset.columns or dataset[column].dtype != dtype:
+                return None
+        if not {'YearStart', 'YearEnd'}.issubset(dataset.columns):
+            return None
         return dataset
 
+    def _write_parquet_cache(self, dataset, cache_tag):
+        """
+        Save the cleaned dataset as Parquet, tagged with cache_tag.
+        The file is written under a unique temporary name and renamed into
+        place, so neither an interrupted write nor two processes starting
+        at once can leave a partial cache behind. The cache is optional:
+        any failure to write it is ignored.
+
+        Args:
+            dataset: Cleaned dataset
+            cache_tag: Tag from _parquet_cache_tag
+        """
+        cache_directory, cache_name = os.path.split(self.parquet_path)
+        try:
+            descriptor, temporary_path = tempfile.mkstemp(
+                prefix=cache_name + '.', suffix='.tmp', dir=cache_directory or '.'
+            )
+        except OSError:
+            return  # Read-only location; the next start parses the CSV again
+        try:
+            with os.fdopen(descriptor, 'wb') as cache_file:
+                table = pyarrow.Table.from_pandas(dataset)
+                table = table.replace_schema_metadata({
+                    **(table.schema.metadata or {}), PARQUET_CACHE_METADATA_KEY: cache_tag
+                })
+                pyarrow.parquet.write_table(table, cache_file, compression='zstd')
+            os.replace(temporary_path, self.parquet_path)
+        except (OSError, pyarrow.ArrowException):
+            try:
+                os.remove(temporary_path)
+            except OSError:
+                pass
+
+    def _contiguous_groups(self, sorted_data, column):
+        """
+        Split data sorted by a categorical column into per-category slices.
+        Group boundaries are found by binary search over the category codes
+        and each group is an iloc slice, so no rows are copied.
+
+        Args:
+            sorted_data: Data sorted by the codes of column, with missing
+                values (code -1) first
+            column: Categorical column to split on
+
+        Returns:
+            dict: Category label -> pandas.DataFrame slice, observed only
+        """
+        categories = sorted_data[column].cat.categories
+        bounds = numpy.searchsorted(
+            sorted_data[column].cat.codes.to_numpy(), numpy.arange(len(categories) + 1)
+        )
+        return {
+            label: sorted_data.iloc[start:end]
+            for label, start, end in zip(categories, bounds[:-1], bounds[1:])
+            if end > start
+        }
+
+    def _question_subset(self, question):
+        """
+        Fetch cached rows answering a question.
+
+        Args:
+            question: Survey question to look up
+
+        Returns:
+            pandas.DataFrame: Matching rows (empty if the question is unknown)
+        """
+        return self._by_question.get(question, self._empty_subset)
+
+    def _question_state_subset(self, question, state):
+        """
+        Fetch cached rows answering a question for a single state.
+
+        Args:
+            question: Survey question to look up
+            state: State name (LocationDesc)
+
+        Returns:
+            pandas.DataFrame: Matching rows (empty if the pair is unknown)
+        """
+        return self._by_question_state.get((question, state), self._empty_subset)
+
+    @lru_cache(maxsize=32)
     def helper_for_states(self, question):
         """
         Execute full processing pipeline for all states.
+        Results are memoized per question and shared between callers,
+        so they must not be mutated.
         
         Args:
             question: Survey question to analyze
@@ -60,29 +250,79 @@ class DataIngestor:
         Returns:
             dict: Processed results for all states
         """
-        query_result = self.data_set[self.data_set['Question'] == question]
-        return self._execute_state_processing_pipeline(query_result)
+        return self._format_final_output(self._state_means(question))
+
+    @lru_cache(maxsize=32)
+    def _state_means(self, question):
+        """
+        Compute (and memoize) the sorted per-state averages of a question.
 
-    def _execute_state_processing_pipeline(self, input_data):
+        Args:
+            question: Survey question to analyze
+
+        Returns:
+            pandas.Series: State averages indexed by state, ascending
+        """
+        labels, means = self._state_means_unsorted(question)
+        return self._sort_aggregated_results(pandas.Series(means, index=labels))
+
+    @lru_cache(maxsize=32)
+    def _state_means_unsorted(self, question):
+        """
+        Compute (and memoize) the per-state averages of a question.
+
+        Args:
+            question: Survey question to analyze
+
+        Returns:
+            tuple: (numpy.ndarray of state names, numpy.ndarray of averages)
+        """
+        aggregated = self._compute_state_aggregates(self._question_subset(question))
+        return aggregated.index.to_numpy(), aggregated.to_numpy()
+
+    def _extreme_states(self, question, count, highest):
+        """
+        Select the states with the lowest or highest averages without
+        sorting all of them.
+
+        Args:
+            question: Survey question to analyze
+            count: Number of states to keep
+            highest: Pick the largest averages (descending) instead of
+                the smallest ones (ascending)
+
+        Returns:
+            dict: Selected states in rank order
+        """
+        labels, means = self._state_means_unsorted(question)
+        count = min(count, len(means))
+        if count == 0:
+            return {}
+
+        keys = -means if highest else means
+        candidates = numpy.argpartition(keys, count - 1)[:count]
+        ranked = candidates[numpy.argsort(keys[candidates])]
+        return dict(zip(labels[ranked].tolist(), means[ranked].tolist()))
+
+    def _execute_state_processing_pipeline(self, input_data, sort=True):
         """
         Complete data processing workflow:
-        1. Temporal filtering
-        2. Numeric conversion
-        3. Aggregation
-        4. Sorting
-        5. Formatting
+        1. Aggregation
+        2. Sorting (optional)
+        3. Formatting
         
         Args:
-            input_data: Subset of data to process
+            input_data: Subset of already cleaned data to process
+            sort: Order the results by value; callers whose output order
+                does not matter (e.g. a single state) can skip it
             
         Returns:
             dict: Formatted results
         """
-        filtered_by_time = self._apply_temporal_filters(input_data)
-        numeric_converted = self._convert_to_numeric_values(filtered_by_time)
-        aggregated_results = self._compute_state_aggregates(numeric_converted)
-        sorted_output = self._sort_aggregated_results(aggregated_results)
-        return self._format_final_output(sorted_output)
+        aggregated_results = self._compute_state_aggregates(input_data)
+        if sort:
+            aggregated_results = self._sort_aggregated_results(aggregated_results)
+        return self._format_final_output(aggregated_results)
 
     def _apply_temporal_filters(self, data_subset):
         """
@@ -101,7 +341,7 @@ class DataIngestor:
 
     def _convert_to_numeric_values(self, data_subset):
         """
-        Convert values to numeric type with error handling.
+        Convert values to float32 with error handling.
         
         Args:
             data_subset: Data to convert
@@ -110,11 +350,12 @@ class DataIngestor:
             pandas.DataFrame: Cleaned numeric data
         """
         modified_data = data_subset.copy()
+        # float32 storage halves the bytes every aggregation scans;
+        # the aggregations themselves accumulate in float64
         modified_data['Data_Value'] = pandas.to_numeric(
             modified_data['Data_Value'],
-            errors='coerce',  # Convert errors to NaN
-            downcast='float'
-        )
+            errors='coerce'  # Convert errors to NaN
+        ).astype('float32')
         return modified_data.dropna(subset=['Data_Value'])
 
     def _compute_state_aggregates(self, processed_data):
@@ -127,7 +368,80 @@ class DataIngestor:
         Returns:
             pandas.Series: State averages
         """
-        return processed_data.groupby('LocationDesc')['Data_Value'].mean()
+        # Bincount over the category codes instead of a full groupby; the
+        # pipeline sorts by value right after, so group order is irrelevant
+        locations = processed_data['LocationDesc'].cat
+        codes = locations.codes.to_numpy()
+        values = processed_data['Data_Value'].to_numpy()
+        known = codes >= 0
+        category_count = len(locations.categories)
+
+        sums = numpy.bincount(codes[known], weights=values[known], minlength=category_count)
+        counts = numpy.bincount(codes[known], minlength=category_count)
+        observed = counts > 0
+        return pandas.Series(
+            sums[observed] / counts[observed],
+            index=locations.categories[observed],
+            name='Data_Value'
+        )
+
+    def _compute_category_aggregates(self, processed_data, group_columns):
+        """
+        Calculate averages per combination of categorical columns.
+
+        The category codes of all grouping columns are folded into a single
+        integer key, so the means come from two bincount passes instead of
+        a multi-key groupby. Only observed combinations are returned.
+
+        Args:
+            processed_data: Cleaned numeric data
+            group_columns: Categorical columns to group by
+
+        Returns:
+            pandas.Series: Averages indexed by a MultiIndex over group_columns
+        """
+        categoricals = [processed_data[column].cat for column in group_columns]
+        codes = [categorical.codes.to_numpy() for categorical in categoricals]
+        sizes = [len(categorical.categories) for categorical in categoricals]
+        known = numpy.logical_and.reduce([column_codes >= 0 for column_codes in codes])
+
+        flat_keys = numpy.ravel_multi_index([column_codes[known] for column_codes in codes], sizes)
+        groups, group_of_row = numpy.unique(flat_keys, return_inverse=True)
+        sums = numpy.bincount(group_of_row, weights=processed_data['Data_Value'].to_numpy()[known])
+        counts = numpy.bincount(group_of_row)
+
+        index = pandas.MultiIndex(
+            levels=[categorical.categories for categorical in categoricals],
+            codes=numpy.unravel_index(groups, sizes),
+            names=group_columns
+        )
+        return pandas.Series(sums / counts, index=index, name='Data_Value')
+
+    def _format_category_results(self, stratified_means):
+        """
+        Convert category averages to a dict keyed by the string form of
+        each group tuple, e.g. "('Ohio', 'Gender', 'Male')".
+
+        The repr of every category is computed once per level and the keys
+        are assembled with vectorized concatenation over the level codes,
+        instead of calling str() on each MultiIndex tuple.
+
+        Args:
+            stratified_means: Averages indexed by a MultiIndex
+
+        Returns:
+            dict: Formatted output
+        """
+        index = stratified_means.index
+        parts = [
+            numpy.array([repr(label) for label in level], dtype=object)[codes]
+            for level, codes in zip(index.levels, index.codes)
+        ]
+        labels = '(' + parts[0]
+        for part in parts[1:]:
+            labels = labels + ', ' + part
+        labels = labels + ')'
+        return dict(zip(labels.tolist(), stratified_means.tolist()))
 
     def _sort_aggregated_results(self, aggregated_data):
         """
@@ -163,9 +477,7 @@ class DataIngestor:
         Returns:
             dict: Processed state results
         """
-        temporal_filtered = self._apply_temporal_filters(data)
-        numeric_converted = self._convert_to_numeric_values(temporal_filtered)
-        aggregated = self._compute_state_aggregates(numeric_converted)
+        aggregated = self._compute_state_aggregates(data)
         sorted_results = self._sort_aggregated_results(aggregated)
         return self._format_final_output(sorted_results)
 
@@ -184,6 +496,31 @@ class DataIngestor:
             return {}
         return self.helper_for_states(question_text)
 
+    def states_mean_batch(self, data):
+        """
+        Calculate state averages for several questions in a single job.
+        Each question reuses the per-question slice and memoized averages
+        that states_mean uses, so no full-table scan is needed.
+        
+        Args:
+            data: Contains 'questions' parameter (list of questions)
+            
+        Returns:
+            dict: Question -> state averages (ascending), for known questions;
+            empty dict if invalid input
+        """
+        questions = data.get('questions', [])
+        if not isinstance(questions, list) or not questions:
+            return {}
+        if not all(isinstance(question, str) for question in questions):
+            return {}
+
+        return {
+            question: self.helper_for_states(question)
+            for question in questions
+            if question in self._by_question
+        }
+
     def state_mean(self, data):
         """
         Calculate average for specific state and question.
@@ -200,12 +537,11 @@ class DataIngestor:
         if not question_param or not state_param:
             return {}
 
-        base_data = self.data_set[self.data_set['Question'] == question_param]
-        if state_param not in base_data['LocationDesc'].unique():
+        state_specific_data = self._question_state_subset(question_param, state_param)
+        if state_specific_data.empty:
             return {}
 
-        state_specific_data = base_data[base_data['LocationDesc'] == state_param]
-        return self._execute_state_processing_pipeline(state_specific_data)
+        return self._execute_state_processing_pipeline(state_specific_data, sort=False)
 
     def best5(self, data):
         """
@@ -221,15 +557,11 @@ class DataIngestor:
         if not question_identifier:
             return {}
 
-        complete_results = self.states_mean(data)
-        items_list = list(complete_results.items())
-        
         # Handle different metric directions
         if question_identifier in self.questions_best_is_min:
-            return dict(items_list[:5])  # Lowest values first
-        elif question_identifier in self.questions_best_is_max:
-            reversed_list = list(reversed(items_list))
-            return dict(reversed_list[:5])  # Highest values first
+            return self._extreme_states(question_identifier, 5, highest=False)
+        if question_identifier in self.questions_best_is_max:
+            return self._extreme_states(question_identifier, 5, highest=True)
         return {}
 
     def worst5(self, data):
@@ -246,15 +578,11 @@ class DataIngestor:
         if not question_identifier:
             return {}
 
-        complete_results = self.states_mean(data)
-        items_list = list(complete_results.items())
-        
         # Inverse logic of best5
         if question_identifier in self.questions_best_is_max:
-            return dict(items_list[:5])
-        elif question_identifier in self.questions_best_is_min:
-            reversed_list = list(reversed(items_list))
-            return dict(reversed_list[:5])
+            return self._extreme_states(question_identifier, 5, highest=False)
+        if question_identifier in self.questions_best_is_min:
+            return self._extreme_states(question_identifier, 5, highest=True)
         return {}
 
     def global_mean(self, data):
@@ -271,28 +599,25 @@ class DataIngestor:
         
         if not target_question or target_question.strip() == '':
             return {'global_mean': 0.0}
-        
-        working_dataset = self.data_set.copy()
-        question_filter_mask = working_dataset['Question'] == target_question
-        filtered_by_question_data = working_dataset.loc[question_filter_mask]
-        
-        converted_values_series = pandas.to_numeric(
-            filtered_by_question_data['Data_Value'], 
-            errors='coerce',
-            downcast='float'
-        )
-        
-        cleaned_values = converted_values_series.dropna()
-        
-        if cleaned_values.empty:
-            average_value = 0.0
-        else:
-            try:
-                average_value = cleaned_values.astype('float64').mean()
-            except Exception as e:
-                average_value = 0.0
-        
-        return {'global_mean': average_value}
+
+        return {'global_mean': self._question_global_mean(target_question)}
+
+    @lru_cache(maxsize=32)
+    def _question_global_mean(self, target_question):
+        """
+        Compute (and memoize) the average over all rows of a question.
+
+        Args:
+            target_question: Survey question to analyze
+
+        Returns:
+            float: Global average, 0.0 if there is no data
+        """
+        values = self._question_subset(target_question)['Data_Value'].to_numpy()
+        if values.size == 0:
+            return 0.0
+        # Data_Value is already numeric and NaN-free; accumulate in float64
+        return float(values.mean(dtype=numpy.float64))
 
     def diff_from_mean(self, input_data):
         """
@@ -304,20 +629,12 @@ class DataIngestor:
         Returns:
             dict: Deviation values for all states
         """
-        query_data = {'question': input_data['question']}
-        all_states = self.data_set['LocationDesc'].unique()
-        global_avg = self.global_mean(input_data)
-
-        differences = {}
-        for region in all_states:
-            query_data['state'] = region
-            state_avg = self.state_mean(query_data)
-            if state_avg:
-                deviation = global_avg['global_mean'] - state_avg[region]
-                differences[region] = deviation
-            query_data.pop('state', None)
+        question_identifier = input_data.get('question', '')
+        if not question_identifier:
+            return {}
 
-        return differences
+        global_avg = self._question_global_mean(question_identifier)
+        return (global_avg - self._state_means(question_identifier)).to_dict()
 
     def state_diff_from_mean(self, data):
         """
@@ -335,8 +652,8 @@ class DataIngestor:
         if not question_identifier or not state_identifier:
             return {}
 
-        national_avg = self.global_mean({'question': question_identifier})['global_mean']
-        state_avg = self.state_mean(data).get(state_identifier, 0)
+        national_avg = self._question_global_mean(question_identifier)
+        state_avg = self._state_means(question_identifier).get(state_identifier, 0)
         return {state_identifier: national_avg - state_avg}
 
     def state_mean_by_category(self, data):
@@ -355,18 +672,17 @@ class DataIngestor:
         if not question_identifier or not state_identifier:
             return {}
 
-        base_data = self.data_set[self.data_set['Question'] == question_identifier]
-        state_data = base_data[base_data['LocationDesc'] == state_identifier]
-        
+        state_data = self._question_state_subset(question_identifier, state_identifier)
+
         if state_data.empty:
             return {}
 
-        numeric_converted = self._convert_to_numeric_values(state_data)
-        stratified_means = numeric_converted.groupby(
-            ['StratificationCategory1', 'Stratification1']
-        )['Data_Value'].mean()
+        # Reuse the question-wide aggregation instead of grouping again
+        stratified_means = self._category_means(question_identifier).xs(
+            state_identifier, level='LocationDesc'
+        )
         
-        return {state_identifier: {str(k): v for k, v in stratified_means.items()}}
+        return {state_identifier: self._format_category_results(stratified_means)}
 
     def mean_by_category(self, data):
         """
@@ -382,10 +698,23 @@ class DataIngestor:
         if not question_identifier:
             return {}
 
-        filtered_data = self.data_set[self.data_set['Question'] == question_identifier]
-        numeric_converted = self._convert_to_numeric_values(filtered_data)
-        stratified_means = numeric_converted.groupby(
+        return self._format_category_results(self._category_means(question_identifier))
+
+    @lru_cache(maxsize=32)
+    def _category_means(self, question):
+        """
+        Compute (and memoize) the averages of a question per state and
+        stratification. Shared by mean_by_category and
+        state_mean_by_category, so the multi-key aggregation runs once.
+
+        Args:
+            question: Survey question to analyze
+
+        Returns:
+            pandas.Series: Averages indexed by (LocationDesc,
+            StratificationCategory1, Stratification1)
+        """
+        return self._compute_category_aggregates(
+            self._question_subset(question),
             ['LocationDesc', 'StratificationCategory1', 'Stratification1']
-        )['Data_Value'].mean()
-        
-        return {str(k): v for k, v in stratified_means.items()}
\ No newline at end of file
+        )
\ No newline at end of file
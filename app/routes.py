@@ -1,9 +1,12 @@
-from threading import Lock
+import itertools
 import logging
-import json
+import threading
 import traceback
-from flask import request, jsonify, abort, Response
+from collections import OrderedDict
+import orjson
+from flask import request, abort, Response
 from app import webserver
+from app.task_runner import QueueFullError, STATUS_RUNNING, STATUS_DONE, STATUS_ERROR, STATUS_NAMES
 
 # Configure logging to write to both file and console
 logging.basicConfig(
@@ -16,23 +19,90 @@ logging.basicConfig(
 )
 logger = logging.getLogger("routes")
 
-# Thread-safe job counter implementation
+# Thread-safe job counter implementation: next() on itertools.count is a
+# single C call, so it is atomic without an explicit lock
 class JobCounter:
     def __init__(self):
-        self._counter = 0
-        self._lock = Lock()
+        self._counter = itertools.count(1)
     
     def get_next_id(self):
-        with self._lock:
-            self._counter += 1
-            return str(self._counter)
+        return str(next(self._counter))
 
 job_counter = JobCounter()
 
+class ResultCache:
+    """
+    Least-recently-used cache of encoded job results. Every job endpoint is
+    a pure function of its payload over the read-only dataset, so an answer
+    can be reused as is. Jobs answered from the cache hold the cached result
+    object itself, so a job's encoding is found from its result and nothing
+    is kept per job. Request threads and workers share the cache, so the
+    recency order is updated under a lock.
+    """
+    def __init__(self, max_entries=4096):
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._by_result = {}
+
+    @staticmethod
+    def make_key(task_callable, payload):
+        """Build a hashable key from the endpoint and its payload"""
+        return task_callable.__name__, orjson.dumps(payload, option=orjson.OPT_SORT_KEYS)
+
+    def store(self, key, result):
+        """Keep a computed result and its encoding, evicting the least
+        recently used entry once the cache is full"""
+        entry = (result, orjson.dumps(result, option=orjson.OPT_SERIALIZE_NUMPY))
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return
+            self._entries[key] = entry
+            # The entry keeps result alive, so its id cannot be reused meanwhile
+            self._by_result[id(result)] = entry
+            if len(self._entries) > self._max_entries:
+                _, evicted = self._entries.popitem(last=False)
+                if self._by_result.get(id(evicted[0])) is evicted:
+                    del self._by_result[id(evicted[0])]
+
+    def lookup(self, key):
+        """Return the cached result for a key, or None on a miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+        return entry[0]
+
+    def encoded_for(self, result):
+        """Return the encoding of a job result, or None if not cached"""
+        entry = self._by_result.get(id(result))
+        return None if entry is None else entry[1]
+
+result_cache = ResultCache()
+
+def json_response(payload, status=200):
+    """
+    Serialize a payload with orjson into a JSON response
+
+    Args:
+        payload: JSON-compatible object (numpy scalars and arrays allowed)
+        status: HTTP status code
+
+    Returns:
+        Response: application/json response
+    """
+    return Response(
+        orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY),
+        status=status,
+        mimetype='application/json'
+    )
+
 def submit_job_request(task_callable):
     """
     Process job requests:
-    - Extract JSON data from request
+    - Parse JSON data from the request body
     - Check for shutdown signal
     - Generate thread-safe unique job ID
     - Add job to queue
@@ -45,34 +115,46 @@ def submit_job_request(task_callable):
         Response: JSON response with job ID or error
     """
     try:
-        # Validate JSON presence
-        if not request.is_json:
-            logger.warning("Request without JSON payload received")
-            return jsonify({'status': 'error', 'reason': 'JSON payload required'}), 400
-            
-        payload = request.json
+        # Parse the body directly; an empty or malformed body is rejected below
+        payload = orjson.loads(request.get_data(cache=False))
         logger.debug("Received job request: %s", payload)
 
         # Check shutdown status
         if webserver.tasks_runner.shutdown_event.is_set():
             logger.info("Shutdown active, rejecting job submission")
-            return jsonify({'job_id': -1, 'status': 'error', 'reason': 'shutting down'}), 503
+            return json_response({'job_id': -1, 'status': 'error', 'reason': 'shutting down'}, 503)
 
         # Generate thread-safe job ID
         job_id_str = job_counter.get_next_id()
-
-        # Add job to queue
-        webserver.tasks_runner.add_job(task_callable, payload, job_id_str)
+        cache_key = ResultCache.make_key(task_callable, payload)
+
+        # Answer repeated requests inline, without a round trip through the queue
+        cached_result = result_cache.lookup(cache_key)
+        if cached_result is not None:
+            webserver.tasks_runner.add_completed_job(job_id_str, cached_result)
+            logger.debug("Job %s answered from cache", job_id_str)
+            return json_response({'job_id': job_id_str, 'status': 'submitted'})
+
+        # Add job to queue, caching its encoded result once computed
+        def cached_task(data):
+            result = task_callable(data)
+            result_cache.store(cache_key, result)
+            return result
+
+        webserver.tasks_runner.add_job(cached_task, payload, job_id_str)
         logger.debug("Job submitted with id: %s", job_id_str)
         
-        return jsonify({'job_id': job_id_str, 'status': 'submitted'})
+        return json_response({'job_id': job_id_str, 'status': 'submitted'})
     
-    except json.JSONDecodeError:
+    except QueueFullError:
+        logger.warning("Job queue full, rejecting job submission")
+        return json_response({'job_id': -1, 'status': 'error', 'reason': 'queue full'}, 503)
+    except orjson.JSONDecodeError:
         logger.error("Invalid JSON in request")
-        return jsonify({'status': 'error', 'reason': 'Invalid JSON format'}), 400
+        return json_response({'status': 'error', 'reason': 'Invalid JSON format'}, 400)
     except Exception as e:
         logger.error("Error submitting job: %s\n%s", str(e), traceback.format_exc())
-        return jsonify({'status': 'error', 'reason': 'Internal server error'}), 500
+        return json_response({'status': 'error', 'reason': 'Internal server error'}, 500)
 
 
 # ------------------ Job endpoints ------------------
@@ -82,6 +164,11 @@ def states_mean_request():
     """Calculate mean values for all states"""
     return submit_job_request(webserver.data_ingestor.states_mean)
 
+@webserver.route('/api/states_mean_batch', methods=['POST'])
+def states_mean_batch_request():
+    """Calculate mean values for all states for several questions"""
+    return submit_job_request(webserver.data_ingestor.states_mean_batch)
+
 @webserver.route('/api/state_mean', methods=['POST'])
 def state_mean_request():
     """Calculate mean for a specific state"""
@@ -136,17 +223,17 @@ def post_endpoint():
     if request.method == 'POST':
         try:
             if not request.is_json:
-                return jsonify({"error": "Request must be JSON"}), 400
+                return json_response({"error": "Request must be JSON"}, 400)
                 
             data = request.json
             logger.debug("Received data in post_endpoint: %s", data)
             response = {"message": "Received data successfully", "data": data}
-            return jsonify(response)
+            return json_response(response)
         except Exception as e:
             logger.error("Error in post_endpoint: %s", str(e))
-            return jsonify({"error": "Server error processing request"}), 500
+            return json_response({"error": "Server error processing request"}, 500)
     
-    return jsonify({"error": "Method not allowed"}), 405
+    return json_response({"error": "Method not allowed"}, 405)
 
 
 @webserver.route('/api/get_results/<job_id>', methods=['GET'])
@@ -159,29 +246,34 @@ def get_response(job_id):
     """
     try:
         logger.debug("Fetching results for job_id: %s", job_id)
-        tasks_runner = webserver.tasks_runner
-        
-        current_status = tasks_runner.job_status.get(job_id)
+        # One read yields a matching status and result, with no lock
+        record = webserver.tasks_runner.get_job_record(job_id)
         
-        if current_status is None:
+        if record is None:
             logger.warning("Invalid job_id requested: %s", job_id)
-            return jsonify({'status': 'error', 'reason': 'Invalid job_id'}), 404
+            return json_response({'status': 'error', 'reason': 'Invalid job_id'}, 404)
         
-        if current_status == 'done':
-            output = tasks_runner.job_results.get(job_id)
-            return jsonify({'status': 'done', 'data': output})
-        elif current_status == 'error':
-            return jsonify({
+        if record.status == STATUS_DONE:
+            encoded = result_cache.encoded_for(record.result)
+            if encoded is not None:
+                # Splice the pre-serialized result instead of re-encoding it
+                return Response(
+                    b'{"status":"done","data":' + encoded + b'}',
+                    mimetype='application/json'
+                )
+            return json_response({'status': 'done', 'data': record.result})
+        if record.status == STATUS_ERROR:
+            return json_response({
                 'status': 'error',
                 'reason': 'Job processing failed',
-                'data': tasks_runner.job_results.get(job_id, {})
-            }), 500
+                'data': record.result
+            }, 500)
         
-        return jsonify({'status': current_status})
+        return json_response({'status': STATUS_NAMES[record.status]})
     
     except Exception as e:
         logger.error("Error retrieving job results: %s", str(e))
-        return jsonify({'status': 'error', 'reason': 'Server error'}), 500
+        return json_response({'status': 'error', 'reason': 'Server error'}, 500)
 
 
 @webserver.route('/api/graceful_shutdown', methods=['GET'])
@@ -195,10 +287,10 @@ def graceful_shutdown():
     try:
         logger.info("Initiating graceful shutdown")
         webserver.tasks_runner.shutdown()
-        return jsonify({'status': 'shutdown initiated'})
+        return json_response({'status': 'shutdown initiated'})
     except Exception as e:
         logger.error("Error during shutdown: %s", str(e))
-        return jsonify({'status': 'error', 'reason': str(e)}), 500
+        return json_response({'status': 'error', 'reason': str(e)}, 500)
 
 
 @webserver.route('/api/num_jobs', methods=['GET'])
@@ -212,10 +304,10 @@ def num_jobs():
     try:
         job_count = webserver.tasks_runner.job_queue.qsize()
         result = 0 if webserver.tasks_runner.shutdown_event.is_set() and job_count == 0 else job_count
-        return jsonify({'jobs': result})
+        return json_response({'jobs': result})
     except Exception as e:
         logger.error("Error getting job count: %s", str(e))
-        return jsonify({'status': 'error', 'reason': str(e)}), 500
+        return json_response({'status': 'error', 'reason': str(e)}, 500)
 
 
 @webserver.route('/api/jobs', methods=['GET'])
@@ -227,14 +319,20 @@ def jobs():
         Response: JSON with all job results
     """
     try:
-        return jsonify({
+        # Snapshot first; workers may add entries while results are collected
+        results = {
+            job_id: record.result
+            for job_id, record in dict(webserver.tasks_runner.job_records).items()
+            if record.status != STATUS_RUNNING
+        }
+        return json_response({
             'status': 'done', 
-            'data': webserver.tasks_runner.job_results,
-            'job_count': len(webserver.tasks_runner.job_results)
+            'data': results,
+            'job_count': len(results)
         })
     except Exception as e:
         logger.error("Error retrieving jobs: %s", str(e))
-        return jsonify({'status': 'error', 'reason': str(e)}), 500
+        return json_response({'status': 'error', 'reason': str(e)}, 500)
 
 
 @webserver.route('/api/job_status', methods=['GET'])
@@ -246,13 +344,17 @@ def job_status():
         Response: JSON with job statuses
     """
     try:
-        return jsonify({
+        return json_response({
             'status': 'done',
-            'data': webserver.tasks_runner.job_status
+            # Snapshot first; workers may add entries while names are mapped
+            'data': {
+                job_id: STATUS_NAMES[record.status]
+                for job_id, record in dict(webserver.tasks_runner.job_records).items()
+            }
         })
     except Exception as e:
         logger.error("Error retrieving job status: %s", str(e))
-        return jsonify({'status': 'error', 'reason': str(e)}), 500
+        return json_response({'status': 'error', 'reason': str(e)}, 500)
 
 
 @webserver.route('/')
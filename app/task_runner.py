@@ -1,31 +1,120 @@
-from queue import Queue, Empty
-from threading import Thread, Event, Lock
+from collections import deque, namedtuple
+from itertools import cycle
+from queue import SimpleQueue, Empty, Full
+from threading import Thread, Event, Lock, Condition
+from time import monotonic
+import atexit
+import logging
+import logging.handlers
 import os
-import json
+import orjson
+
+
+class _RootHandlers(logging.Handler):
+    """Hands each record to the root logger's handlers, as propagation would
+
+    The root handlers are looked up per record, so the ones routes installs
+    with basicConfig (webserver.log and the console) are used even though
+    they are configured after the first ThreadPool is created.
+    """
+    def emit(self, record):
+        for handler in logging.getLogger().handlers:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+
+# Workers only enqueue log records; a listener thread, started by the first
+# ThreadPool, writes them through the root handlers. Propagation stays off so
+# the workers never take the file handler's lock themselves
+_log_queue = SimpleQueue()
+_log_listener = logging.handlers.QueueListener(_log_queue, _RootHandlers())
+_log_listener_lock = Lock()
+_log_listener_started = Event()
+
+logger = logging.getLogger("task_runner")
+logger.setLevel(logging.DEBUG)
+logger.addHandler(logging.handlers.QueueHandler(_log_queue))
+logger.propagate = False
+
+
+def _start_log_listener():
+    """Start the shared log listener thread once per process"""
+    with _log_listener_lock:
+        if not _log_listener_started.is_set():
+            _log_listener.start()
+            atexit.register(_log_listener.stop)
+            _log_listener_started.set()
+
+
+# Poison pill: a worker that takes it from the queue exits
+_SHUTDOWN = object()
+
+# Job status codes; small ints are cached singletons, so status entries cost
+# no per-job object. STATUS_NAMES maps a code to its name for the HTTP layer
+STATUS_RUNNING, STATUS_DONE, STATUS_ERROR = 0, 1, 2
+STATUS_NAMES = ("running", "done", "error")
+
+# Everything known about a job, published with a single dict assignment so
+# readers always see a status together with its matching result
+JobRecord = namedtuple("JobRecord", ["status", "result"])
+
+
+class QueueFullError(Exception):
+    """Raised by add_job when the job queue is at capacity"""
+
 
 class ThreadPool:
     """
     Thread pool implementation for parallel job processing.
     Manages a queue of jobs that are processed by a configurable number of worker threads.
     """
-    def __init__(self):
+    def __init__(self, max_queue_size=None, executor=None, persist_results=None):
+        """
+        Args:
+            max_queue_size: Maximum number of queued jobs, defaults to
+                num_threads * 64
+            executor: Optional concurrent.futures executor that runs job
+                callables; workers then only publish and persist results.
+                By default jobs run inline in the worker threads. A
+                ProcessPoolExecutor needs picklable module-level callables,
+                so it cannot run the jobs routes.submit_job_request queues:
+                those are local cached_task closures. The app's pool is
+                therefore created without an executor. Workers are not
+                pinned to CPUs when an executor is given, since the
+                executor's threads and processes are started from a
+                worker's submit() and would inherit its single-CPU mask.
+            persist_results: Whether to write results/job_<id>.json files,
+                defaults to the TP_PERSIST environment variable (any value
+                but "0" enables it). Results are always kept in memory.
+        """
         # Fundamental data structures
-        self.job_queue = Queue()
-        self.status_lock = Lock()  # For thread-safe access to dictionaries
-        self.job_status = {}
-        self.job_results = {}
+        # One immutable JobRecord per job ID; single-key dict reads, writes
+        # and setdefault are atomic, so the map is used without a lock
+        self.job_records = {}
         self.shutdown_event = Event()
+        if persist_results is None:
+            persist_results = os.getenv("TP_PERSIST", "1") != "0"
+        self.persist_results = persist_results
+        # No writer thread and no file I/O at all when persistence is off
+        self.artifact_writer = AsyncArtifactWriter() if persist_results else None
+        self.executor = executor
+        _start_log_listener()
         
         # Initial configuration
-        self._setup_worker_infrastructure()
+        self._setup_worker_infrastructure(max_queue_size)
         self._initialize_workers()
 
-    def _setup_worker_infrastructure(self):
+    def _setup_worker_infrastructure(self, max_queue_size):
         """Configure basic execution parameters"""
         # Determine the number of threads
         env_value = os.getenv("TP_NUM_OF_THREADS")
         system_cores = os.cpu_count() or 1
         self.num_threads = self._calculate_optimal_thread_count(env_value, system_cores)
+
+        # One queue shard per worker, bounded so producers get backpressure
+        if max_queue_size is None:
+            max_queue_size = self.num_threads * 64
+        self.job_queue = ShardedJobQueue(self.num_threads, max_queue_size)
         
         # Initialize worker containers
         self.workers = []
@@ -46,18 +135,41 @@ class ThreadPool:
 
     def _spawn_and_register_worker(self):
         """Create a new worker and add it to the pool"""
-        task_executor = self._create_task_executor()
+        worker_index = len(self.workers)
+        task_executor = self._create_task_executor(
+            shard_index=worker_index,
+            core_id=self._select_worker_core(worker_index)
+        )
         task_executor.start()
         self.workers.append(task_executor)
 
-    def _create_task_executor(self):
+    def _select_worker_core(self, worker_index):
+        """Pick a CPU for a worker, spreading workers as far apart as possible
+
+        Workers are placed every len(cpus) // num_threads CPUs, so with fewer
+        workers than CPUs they land on different cores (and sockets) first.
+        With an executor the workers stay unpinned: executors start their
+        workers lazily inside submit(), and those would inherit the
+        submitting worker's affinity and all share its one CPU.
+
+        Returns:
+            int: CPU id, or None if the worker should not be pinned
+        """
+        if self.executor is not None or not hasattr(os, "sched_getaffinity"):
+            return None
+        allowed_cpus = sorted(os.sched_getaffinity(0))
+        stride = max(1, len(allowed_cpus) // self.num_threads)
+        return allowed_cpus[(worker_index * stride) % len(allowed_cpus)]
+
+    def _create_task_executor(self, shard_index, core_id):
         """Create a properly configured task executor"""
         return TaskRunner(
             task_queue=self.job_queue,
-            status_registry=self.job_status,
-            result_store=self.job_results,
-            shutdown_flag=self.shutdown_event,
-            status_lock=self.status_lock
+            shard_index=shard_index,
+            core_id=core_id,
+            record_store=self.job_records,
+            artifact_writer=self.artifact_writer,
+            executor=self.executor
         )
 
     def add_job(self, task_func, payload, job_id):
@@ -70,28 +182,84 @@ class ThreadPool:
             
         Raises:
             ValueError: If job_id is already in use
+            QueueFullError: If the job queue is at capacity
         """
-        job_id_str = str(job_id)
-        self._validate_job_identifier(job_id_str)
+        job_id_str = self._norm(job_id)
+        self._claim_job_identifier(job_id_str)
         self._register_new_job(task_func, payload, job_id_str)
         return job_id_str
 
-    def _validate_job_identifier(self, job_id):
-        """Ensure job ID uniqueness"""
-        with self.status_lock:
-            if job_id in self.job_status:
-                raise ValueError(f"Duplicate job ID: {job_id}")
+    def add_completed_job(self, job_id, result):
+        """Register a job whose result is already known, bypassing the queue
+
+        Args:
+            job_id: Unique identifier for the job
+            result: The job result
+
+        Raises:
+            ValueError: If job_id is already in use
+        """
+        job_id_str = self._norm(job_id)
+        self._claim_job_identifier(job_id_str, JobRecord(STATUS_DONE, result))
+        if self.artifact_writer is not None:
+            self.artifact_writer.submit(job_id_str, result)
+        return job_id_str
+
+    @staticmethod
+    def _norm(job_id):
+        """Return job_id as the str used to key the job maps
+
+        The HTTP layer already hands out str IDs, which are returned as-is
+        """
+        if isinstance(job_id, str):
+            return job_id
+        return str(job_id)
+
+    def _claim_job_identifier(self, job_id, record=None):
+        """Ensure job ID uniqueness and publish the job's first record
+
+        setdefault checks and inserts in one atomic step, and every claim
+        brings a fresh record, so getting back any other object means the
+        ID was already taken. Queued jobs are marked running before a
+        worker can see them, so a fast worker's record is never overwritten.
+
+        Args:
+            job_id: Normalized job identifier
+            record: Initial JobRecord, a running record by default
+        """
+        if record is None:
+            record = JobRecord(STATUS_RUNNING, None)
+        if self.job_records.setdefault(job_id, record) is not record:
+            raise ValueError(f"Duplicate job ID: {job_id}")
 
     def _register_new_job(self, func, data, job_id):
-        """Register a job in the system"""
-        self.job_queue.put((func, data, job_id))
-        with self.status_lock:
-            self.job_status[job_id] = "running"
+        """Register a job in the system
+
+        Raises:
+            QueueFullError: If the job queue is at capacity; the job's
+                claimed ID is released again
+        """
+        try:
+            self.job_queue.put_nowait((func, data, job_id))
+        except Full as e:
+            del self.job_records[job_id]
+            raise QueueFullError(f"Job queue is full, rejected job {job_id}") from e
         self._log_job_submission(job_id)
 
     def _log_job_submission(self, job_id):
         """Dedicated logger for job addition events"""
-        print(f"[System] Job {job_id} adăugat în coadă")
+        logger.debug("Job %s added to the queue", job_id)
+
+    def get_job_record(self, job_id):
+        """Get the status and result of a job with a single lock-free read
+
+        Args:
+            job_id: The job identifier
+
+        Returns:
+            JobRecord: The job's current record or None if job not found
+        """
+        return self.job_records.get(self._norm(job_id))
 
     def get_job_status(self, job_id):
         """Get the status of a job
@@ -100,10 +268,10 @@ class ThreadPool:
             job_id: The job identifier
             
         Returns:
-            str: The job status or None if job not found
+            int: The job status code (STATUS_*) or None if job not found
         """
-        with self.status_lock:
-            return self.job_status.get(str(job_id))
+        record = self.job_records.get(self._norm(job_id))
+        return None if record is None else record.status
             
     def get_job_result(self, job_id):
         """Get the result of a completed job
@@ -114,43 +282,52 @@ class ThreadPool:
         Returns:
             The job result or None if job not found or not completed
         """
-        status = self.get_job_status(job_id)
-        if status == "done":
-            with self.status_lock:
-                return self.job_results.get(str(job_id))
+        # Status and result come from the same record, so they always match
+        record = self.job_records.get(self._norm(job_id))
+        if record is not None and record.status == STATUS_DONE:
+            return record.result
         return None
 
     def shutdown(self):
         """Initiate the orderly shutdown process"""
         if self.shutdown_event.is_set():
-            print("[Warning] Shutdown already in progress")
+            logger.warning("Shutdown already in progress")
             return
             
         self._activate_shutdown_sequence()
         self._await_pending_operations()
         self._terminate_workers()
+        self._release_artifact_writer()
 
     def _activate_shutdown_sequence(self):
         """Transition the system to shutdown mode"""
         self.shutdown_event.set()
-        print("[System] Inițiat proces de shutdown")
+        logger.info("Shutdown initiated")
 
     def _await_pending_operations(self):
         """Wait for remaining tasks to complete"""
         try:
             self.job_queue.join()
-            print("[System] Toate task-urile au fost finalizate")
+            logger.info("All tasks have finished")
         except Exception as e:
-            print(f"[Error] Error waiting for pending operations: {str(e)}")
+            logger.error("Error waiting for pending operations: %s", e)
 
     def _terminate_workers(self):
         """Stop all executors"""
+        # One pill per worker; each worker exits after taking a single pill
+        for _ in self.workers:
+            self.job_queue.put(_SHUTDOWN)
         for worker in self.workers:
             try:
                 worker.join(timeout=5.0)  # Add timeout to prevent hanging
             except Exception:
                 pass
-        print("[System] Toate workerii au fost opriți")
+        logger.info("All workers have stopped")
+
+    def _release_artifact_writer(self):
+        """Write the remaining results, then stop the writer thread"""
+        if self.artifact_writer is not None:
+            self.artifact_writer.close()
 
 
 class TaskRunner(Thread):
@@ -158,78 +335,325 @@ class TaskRunner(Thread):
     Task executor that processes jobs from a queue.
     Each instance runs in its own thread and processes jobs until shutdown.
     """
-    def __init__(self, task_queue, status_registry, result_store, shutdown_flag, status_lock):
+    def __init__(self, task_queue, shard_index, core_id, record_store, artifact_writer,
+                 executor=None):
         super().__init__(daemon=True)
         self.task_source = task_queue
-        self.status_tracker = status_registry
-        self.result_archive = result_store
-        self.shutdown_indicator = shutdown_flag
-        self.status_lock = status_lock
+        self.shard_index = shard_index
+        self.core_id = core_id
+        self.record_store = record_store
+        self.artifact_writer = artifact_writer
+        self.executor = executor
 
     def run(self):
         """Main execution cycle"""
-        while not self._should_terminate():
+        self._pin_to_core()
+        while True:
             try:
-                self._process_next_task()
+                if not self._process_next_task():
+                    return
             except Exception:
                 pass
 
-    def _should_terminate(self):
-        """Check termination conditions"""
-        return self.shutdown_indicator.is_set() and self.task_source.empty()
+    def _pin_to_core(self):
+        """Bind this thread to its CPU so the scheduler does not migrate it"""
+        if self.core_id is None or not hasattr(os, "sched_setaffinity"):
+            return
+        try:
+            # On Linux, pid 0 targets the calling thread only
+            os.sched_setaffinity(0, {self.core_id})
+        except OSError as e:
+            logger.warning("Could not pin worker to CPU %s: %s", self.core_id, e)
 
     def _process_next_task(self):
-        """Extract and execute a task from the queue"""
-        task_id = None
+        """Extract and execute a task from the queue
+
+        Blocks until a task arrives; no periodic wakeups are needed since
+        shutdown is signalled by a poison pill.
+
+        Returns:
+            bool: False once the shutdown pill has been taken
+        """
+        task = self.task_source.get(self.shard_index)
         try:
-            # Add timeout to allow checking shutdown condition periodically
-            try:
-                task_func, input_data, task_id = self.task_source.get(timeout=1.0)
-                self._execute_task_safely(task_func, input_data, task_id)
-            except Empty:
-                return
-        except Exception:
-            pass
+            if task is _SHUTDOWN:
+                return False
+            task_func, input_data, task_id = task
+            self._execute_task_safely(task_func, input_data, task_id)
+            return True
         finally:
-            # Make sure we always call task_done() if we called get()
-            if task_id is not None:
-                self._finalize_task_processing()
+            # Every get() is matched by exactly one task_done()
+            self._finalize_task_processing()
 
     def _execute_task_safely(self, func, data, task_id):
         """Execute a task with exception handling"""
         try:
-            result = func(data)
+            if self.executor is None:
+                result = func(data)
+            else:
+                result = self.executor.submit(func, data).result()
             self._handle_successful_execution(task_id, result)
         except Exception as e:
             self._handle_execution_failure(task_id, e)
 
     def _handle_successful_execution(self, task_id, result):
         """Process successful results"""
-        with self.status_lock:
-            self.result_archive[task_id] = result
-            self.status_tracker[task_id] = "done"
-            
-        self._persist_execution_results(task_id, result)
+        # One assignment publishes the status and the result together
+        self.record_store[task_id] = JobRecord(STATUS_DONE, result)
+
+        if self.artifact_writer is not None:
+            self.artifact_writer.submit(task_id, result)
 
     def _handle_execution_failure(self, task_id, error):
         """Process execution errors"""
-        with self.status_lock:
-            self.status_tracker[task_id] = "error"
-            self.result_archive[task_id] = {"error": str(error)}
-            
-        print(f"[Eroare] Task {task_id} a eșuat: {str(error)}")
-        # Also persist error results
-        self._persist_execution_results(task_id, {"error": str(error), "type": type(error).__name__})
+        # Stringify once; the same record is stored, persisted and logged
+        err_msg = str(error)
+        err_type = type(error).__name__
+        error_record = {"error": err_msg, "type": err_type}
 
-    def _persist_execution_results(self, task_id, data):
-        """Save results to disk"""
-        try:
-            os.makedirs("results", exist_ok=True)
-            with open(f"results/job_{task_id}.json", "w") as f:
-                json.dump(data, f, indent=2)
-        except Exception as e:
-            print(f"[Error] Failed to persist results for job {task_id}: {str(e)}")
+        self.record_store[task_id] = JobRecord(STATUS_ERROR, error_record)
+
+        logger.error("Task %s failed: %s", task_id, err_msg)
+        # Also persist error results
+        if self.artifact_writer is not None:
+            self.artifact_writer.submit(task_id, error_record)
 
     def _finalize_task_processing(self):
         """Finalize task processing"""
-        self.task_source.task_done()
\ No newline at end of file
+        self.task_source.task_done()
+
+
+class ShardedJobQueue:
+    """
+    Job queue split into one deque per worker, with work stealing.
+    Jobs are dealt round-robin across shards; a worker takes the oldest job
+    of its own shard and, when that is empty, steals the oldest job of
+    another shard. deque appends and pops are atomic, so taking a job needs
+    no lock. Each shard has its own condition: an idle worker sleeps only
+    on its shard's condition, and a producer locks a condition only to
+    wake an idle worker, so while every worker is busy no lock is shared.
+    Mirrors the Queue methods used by the pool (put/put_nowait/get/
+    task_done/join). Items must not be None.
+    Unfinished jobs are counted under a plain lock that is held only for
+    the increment or decrement; there is no condition to notify, and the
+    drained event is only set while a join() is waiting.
+    """
+    def __init__(self, shard_count, maxsize):
+        self.shards = [deque() for _ in range(shard_count)]
+        self._ready = [Condition(Lock()) for _ in range(shard_count)]
+        self._idle = [False] * shard_count
+        self._next_shard = cycle(range(shard_count))
+        self.maxsize = maxsize
+        self._unfinished = 0
+        self._unfinished_lock = Lock()
+        self._draining = False
+        self._drained = Event()
+
+    def put(self, item):
+        """Append a job to the next shard in round-robin order
+
+        Does not check the capacity; the pool only uses it for the
+        shutdown pills, which must never be rejected.
+        """
+        with self._unfinished_lock:
+            self._unfinished += 1
+        shard_index = next(self._next_shard)
+        self.shards[shard_index].append(item)
+        self._wake_idle_worker(shard_index)
+
+    def put_nowait(self, item):
+        """Append a job unless the queue is at capacity
+
+        The size check is not atomic with the append, so concurrent
+        producers may overshoot maxsize by at most their own number.
+
+        Raises:
+            Full: If the queue is at capacity
+        """
+        if self.qsize() >= self.maxsize:
+            raise Full
+        self.put(item)
+
+    def _wake_idle_worker(self, preferred_index):
+        """Wake one idle worker, trying the given shard's worker first
+
+        Idle flags are peeked without a lock, then re-checked and cleared
+        under the shard's lock, so two producers never spend their wakeup
+        on the same worker.
+        """
+        shard_count = len(self.shards)
+        for offset in range(shard_count):
+            index = (preferred_index + offset) % shard_count
+            if not self._idle[index]:
+                continue
+            with self._ready[index]:
+                if self._idle[index]:
+                    self._idle[index] = False
+                    self._ready[index].notify()
+                    return
+
+    def get(self, shard_index, timeout=None):
+        """Take a job, preferring the given shard
+
+        Raises:
+            Empty: If no job arrives within timeout
+        """
+        deadline = None if timeout is None else monotonic() + timeout
+        ready = self._ready[shard_index]
+        while True:
+            item = self._take(shard_index)
+            if item is not None:
+                return item
+            with ready:
+                # Advertise idleness before the final emptiness check: a
+                # job appended after the check is then guaranteed to find
+                # the flag set, and its producer's notify needs this lock,
+                # which is only released by wait()
+                self._idle[shard_index] = True
+                if self.empty():
+                    remaining = None if deadline is None else deadline - monotonic()
+                    if remaining is not None and remaining <= 0:
+                        self._idle[shard_index] = False
+                        raise Empty
+                    ready.wait(remaining)
+                self._idle[shard_index] = False
+
+    def _take(self, shard_index):
+        """Pop the oldest job of the given shard, else steal one
+
+        Returns:
+            The job, or None if every shard is empty
+        """
+        shard_count = len(self.shards)
+        for offset in range(shard_count):
+            try:
+                return self.shards[(shard_index + offset) % shard_count].popleft()
+            except IndexError:
+                continue
+        return None
+
+    def task_done(self):
+        """Mark a previously taken job as finished"""
+        with self._unfinished_lock:
+            self._unfinished -= 1
+            # Set under the lock, so a join() that starts right after this
+            # cannot have its fresh wait satisfied by a stale set()
+            if self._draining and self._unfinished == 0:
+                self._draining = False
+                self._drained.set()
+
+    def join(self):
+        """Block until every queued job has been marked done
+
+        Jobs put while join() waits are waited for as well, since the event
+        is only set when the unfinished count itself reaches zero.
+        """
+        with self._unfinished_lock:
+            if self._unfinished == 0:
+                return
+            self._draining = True
+            self._drained.clear()
+        self._drained.wait()
+
+    def qsize(self):
+        """Number of jobs waiting in all shards"""
+        return sum(len(shard) for shard in self.shards)
+
+    def empty(self):
+        """Whether no job is waiting in any shard"""
+        return self.qsize() == 0
+
+
+class AsyncArtifactWriter:
+    """
+    Background writer that saves job results to disk.
+    Workers only enqueue results; a single dedicated thread serializes them
+    in batches, so file I/O stays off the task execution path. The queue is
+    a SimpleQueue with no per-item task_done bookkeeping; flush() instead
+    enqueues a marker event that the writer sets once it reaches it.
+    """
+    def __init__(self, directory="results", batch_size=64):
+        self.directory = directory
+        self.batch_size = batch_size
+        self.pending = SimpleQueue()
+        os.makedirs(self.directory, exist_ok=True)
+        # Open the directory once; files are then created relative to it,
+        # so no write has to resolve the directory path again
+        self.directory_fd = os.open(self.directory, os.O_RDONLY | os.O_DIRECTORY)
+
+        self.writer_thread = Thread(target=self._write_loop, daemon=True)
+        self.writer_thread.start()
+
+    def submit(self, task_id, data):
+        """Queue a result to be written as results/job_<task_id>.json"""
+        self.pending.put((task_id, data))
+
+    def flush(self):
+        """Block until every result submitted before this call is written
+
+        Returns:
+            bool: False if the writer thread died before reaching them
+        """
+        # The single writer drains in FIFO order, so everything queued
+        # ahead of the marker has been written when it is set
+        written = Event()
+        self.pending.put(written)
+        while not written.wait(timeout=1.0):
+            if not self.writer_thread.is_alive():
+                logger.error("Artifact writer stopped; pending results were not written")
+                return False
+        return True
+
+    def close(self):
+        """Write everything submitted so far, then stop the writer thread
+        and release the directory descriptor"""
+        if self.directory_fd is None:
+            return
+        self.pending.put(_SHUTDOWN)
+        self.writer_thread.join(timeout=5.0)
+        if self.writer_thread.is_alive():
+            # Closing the fd under a live writer could let it write into
+            # whatever file reuses the descriptor number
+            logger.warning("Artifact writer did not stop; keeping its directory open")
+            return
+        os.close(self.directory_fd)
+        self.directory_fd = None
+
+    def _write_loop(self):
+        """Drain the queue in batches until close() sends the pill"""
+        while True:
+            batch = [self.pending.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.pending.get_nowait())
+                except Empty:
+                    break
+
+            for item in batch:
+                if item is _SHUTDOWN:
+                    return
+                if isinstance(item, Event):
+                    item.set()
+                else:
+                    self._write_artifact(*item)
+
+    def _write_artifact(self, task_id, data):
+        """Write one result atomically through a temporary file
+
+        The result is serialized compactly with orjson and written with a
+        single write() call.
+        """
+        final_name = f"job_{task_id}.json"
+        temporary_name = final_name + ".tmp"
+        try:
+            data_bytes = orjson.dumps(data, option=orjson.OPT_SERIALIZE_NUMPY)
+            fd = os.open(temporary_name, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644,
+                         dir_fd=self.directory_fd)
+            try:
+                os.write(fd, data_bytes)
+            finally:
+                os.close(fd)
+            os.replace(temporary_name, final_name,
+                       src_dir_fd=self.directory_fd, dst_dir_fd=self.directory_fd)
+        except (OSError, TypeError, ValueError) as e:
+            logger.error("Failed to persist results for job %s: %s", task_id, e)
@@ -0,0 +1,130 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import pyarrow
+
+from app.data_ingestor import DataIngestor
+
+REPO_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+SAMPLE_CSV = """YearStart,YearEnd,LocationDesc,Question,Data_Value,StratificationCategory1,Stratification1
+2015,2015,Ohio,Q1,10,Total,Total
+2016,2016,Ohio,Q1,20,Total,Total
+2015,2015,Utah,Q1,40,Gender,Female
+2015,2015,Utah,Q2,5,Gender,Male
+2005,2005,Utah,Q1,99,Total,Total
+"""
+
+
+class TestParquetCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.csv_path = os.path.join(self.directory, "data.csv")
+        with open(self.csv_path, "w", encoding="utf-8") as csv_file:
+            csv_file.write(SAMPLE_CSV)
+        self.parquet_path = self.csv_path + ".parquet"
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_cache_is_written_and_reused(self):
+        first = DataIngestor(self.csv_path)
+        self.assertEqual(sorted(os.listdir(self.directory)), ["data.csv", "data.csv.parquet"])
+        second = DataIngestor(self.csv_path)
+        self.assertEqual(second.data_set["Data_Value"].dtype, "float32")
+        self.assertEqual(second.helper_for_states("Q1"), first.helper_for_states("Q1"))
+
+    def test_corrupt_cache_falls_back_to_csv(self):
+        DataIngestor(self.csv_path)
+        with open(self.parquet_path, "r+b") as parquet_file:
+            parquet_file.truncate(100)
+        os.utime(self.parquet_path)
+
+        ingestor = DataIngestor(self.csv_path)
+        self.assertEqual(ingestor.helper_for_states("Q1"), {"Ohio": 15.0, "Utah": 40.0})
+        # The broken file is replaced by a readable one
+        self.assertEqual(DataIngestor(self.csv_path).helper_for_states("Q2"), {"Utah": 5.0})
+
+    def test_cache_is_rebuilt_when_csv_changes(self):
+        DataIngestor(self.csv_path)
+        with open(self.csv_path, "a", encoding="utf-8") as csv_file:
+            csv_file.write("2015,2015,Iowa,Q2,7,Total,Total\n")
+
+        ingestor = DataIngestor(self.csv_path)
+        self.assertEqual(ingestor.helper_for_states("Q2"), {"Utah": 5.0, "Iowa": 7.0})
+
+    def test_failed_cache_write_is_ignored(self):
+        with patch("pyarrow.parquet.write_table", side_effect=pyarrow.ArrowInvalid("bad column")):
+            ingestor = DataIngestor(self.csv_path)
+        self.assertEqual(ingestor.helper_for_states("Q2"), {"Utah": 5.0})
+        self.assertEqual(os.listdir(self.directory), ["data.csv"])
+
+    def test_untagged_cache_is_ignored(self):
+        # A cache from before tagging, newer than the CSV and missing the cleaning
+        DataIngestor(self.csv_path).data_set.astype({"Data_Value": "float64"}).to_parquet(
+            self.parquet_path
+        )
+        ingestor = DataIngestor(self.csv_path)
+        self.assertEqual(ingestor.data_set["Data_Value"].dtype, "float32")
+
+
+class TestMissingKeys(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.csv_path = os.path.join(self.directory, "data.csv")
+        with open(self.csv_path, "w", encoding="utf-8") as csv_file:
+            csv_file.write(SAMPLE_CSV)
+            # Rows without a Question or a state must not land in any subset
+            csv_file.write("2015,2015,Iowa,,9,Total,Total\n")
+            csv_file.write("2015,2015,,Q2,100,Total,Total\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_rows_with_missing_keys_are_excluded(self):
+        # The second instance reads the Parquet cache, which must agree
+        for ingestor in (DataIngestor(self.csv_path), DataIngestor(self.csv_path)):
+            self.assertEqual(ingestor.helper_for_states("Q1"), {"Ohio": 15.0, "Utah": 40.0})
+            self.assertEqual(ingestor.helper_for_states("Q2"), {"Utah": 5.0})
+            self.assertEqual(ingestor.state_mean({"question": "Q2", "state": "Utah"}), {"Utah": 5.0})
+
+
+class TestStatesMeanBatch(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.ingestor = DataIngestor(
+            os.path.join(REPO_ROOT, "nutrition_activity_obesity_usa_subset.csv")
+        )
+
+    def test_matches_fixtures(self):
+        fixture_dir = os.path.join(REPO_ROOT, "tests", "states_mean_batch")
+        for name in sorted(os.listdir(os.path.join(fixture_dir, "input"))):
+            with self.subTest(fixture=name):
+                with open(os.path.join(fixture_dir, "input", name), encoding="utf-8") as f:
+                    payload = json.load(f)
+                output_name = name.replace("in-", "out-")
+                with open(os.path.join(fixture_dir, "output", output_name), encoding="utf-8") as f:
+                    expected = json.load(f)
+
+                result = self.ingestor.states_mean_batch(payload)
+                self.assertEqual(list(result), list(expected))
+                for question, state_means in expected.items():
+                    self.assertEqual(list(result[question]), list(state_means))
+                    for state, value in state_means.items():
+                        self.assertAlmostEqual(result[question][state], value, delta=0.01)
+
+    def test_rejects_non_string_questions(self):
+        for questions in ([["Q"]], [{"question": "Q"}], [1], "Q", []):
+            with self.subTest(questions=questions):
+                self.assertEqual(self.ingestor.states_mean_batch({"questions": questions}), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+import json
+import os
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from app import webserver
+from app.routes import ResultCache
+from app.task_runner import QueueFullError, ThreadPool
+
+
+def states_mean(payload):
+    return payload
+
+
+class TestResultCache(unittest.TestCase):
+
+    def test_evicts_least_recently_used(self):
+        cache = ResultCache(max_entries=2)
+        keys = [ResultCache.make_key(states_mean, {"question": q}) for q in "abc"]
+        results = [{"a": 1}, {"b": 2}, {"c": 3}]
+        cache.store(keys[0], results[0])
+        cache.store(keys[1], results[1])
+        # Touch the oldest entry so the second one becomes the eviction victim
+        self.assertIs(cache.lookup(keys[0]), results[0])
+        cache.store(keys[2], results[2])
+
+        self.assertIs(cache.lookup(keys[0]), results[0])
+        self.assertIsNone(cache.lookup(keys[1]))
+        self.assertIs(cache.lookup(keys[2]), results[2])
+        self.assertIsNone(cache.encoded_for(results[1]))
+        self.assertEqual(cache.encoded_for(results[2]), b'{"c":3}')
+
+    def test_junk_entries_do_not_pin_the_cache(self):
+        cache = ResultCache(max_entries=4)
+        hot_key = ResultCache.make_key(states_mean, {"question": "hot"})
+        for junk in range(10):
+            cache.store(ResultCache.make_key(states_mean, {"question": str(junk)}), {})
+        cache.store(hot_key, {"Ohio": 1.0})
+        self.assertEqual(cache.lookup(hot_key), {"Ohio": 1.0})
+
+    def test_encoding_is_found_from_result_identity(self):
+        cache = ResultCache()
+        result = {"Ohio": 1.5}
+        cache.store(ResultCache.make_key(states_mean, {"question": "q"}), result)
+        self.assertEqual(cache.encoded_for(result), b'{"Ohio":1.5}')
+        self.assertIsNone(cache.encoded_for({"Ohio": 1.5}))
+
+
+class TestQueueFull(unittest.TestCase):
+
+    def test_full_queue_answers_503_without_recording_the_job(self):
+        pool = ThreadPool(max_queue_size=1, persist_results=False)
+        gate, started = threading.Event(), threading.Semaphore(0)
+
+        def blocker(_):
+            started.release()
+            gate.wait(timeout=5)
+
+        # Occupy every worker first, so nothing frees a slot once the queue is
+        # full; each blocker is taken before the next one is queued
+        for worker in range(pool.num_threads):
+            pool.add_job(blocker, None, f"busy-{worker}")
+            self.assertTrue(started.acquire(timeout=5))
+        with self.assertRaises(QueueFullError):
+            for job_id in range(10):
+                pool.add_job(blocker, None, f"queued-{job_id}")
+        records_before = dict(pool.job_records)
+
+        with patch.object(webserver, "tasks_runner", pool):
+            response = webserver.test_client().post(
+                "/api/states_mean", json={"question": "Question only used by the queue-full test"}
+            )
+        gate.set()
+        pool.shutdown()
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.get_json(), {"job_id": -1, "status": "error", "reason": "queue full"})
+        self.assertEqual(set(pool.job_records), set(records_before))
+
+class TestStatesMeanBatchRoute(unittest.TestCase):
+
+    def test_batch_job_returns_the_fixture_result(self):
+        fixture_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "tests", "states_mean_batch")
+        with open(os.path.join(fixture_dir, "input", "in-1.json"), encoding="utf-8") as f:
+            payload = json.load(f)
+        with open(os.path.join(fixture_dir, "output", "out-1.json"), encoding="utf-8") as f:
+            expected = json.load(f)
+
+        pool = ThreadPool(persist_results=False)
+        try:
+            with patch.object(webserver, "tasks_runner", pool):
+                client = webserver.test_client()
+                job_id = client.post("/api/states_mean_batch", json=payload).get_json()["job_id"]
+                deadline = time.monotonic() + 5
+                body = client.get(f"/api/get_results/{job_id}").get_json()
+                while body["status"] == "running" and time.monotonic() < deadline:
+                    time.sleep(0.01)
+                    body = client.get(f"/api/get_results/{job_id}").get_json()
+        finally:
+            pool.shutdown()
+
+        self.assertEqual(body["status"], "done")
+        self.assertEqual(list(body["data"]), list(expected))
+        for question, state_means in expected.items():
+            self.assertEqual(set(body["data"][question]), set(state_means))
+            for state, value in state_means.items():
+                self.assertAlmostEqual(body["data"][question][state], value, delta=0.01)
+
+
+if __name__ == "__main__":
+    unittest.main()
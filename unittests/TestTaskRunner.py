@@ -0,0 +1,296 @@
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from queue import Empty
+from unittest.mock import patch
+
+from app.task_runner import (
+    AsyncArtifactWriter, QueueFullError, ShardedJobQueue, ThreadPool, STATUS_DONE, STATUS_ERROR
+)
+
+
+class TestShardedJobQueue(unittest.TestCase):
+
+    def test_own_shard_is_first_in_first_out(self):
+        queue = ShardedJobQueue(1, maxsize=10)
+        for item in range(5):
+            queue.put_nowait(item)
+        self.assertEqual([queue.get(0) for _ in range(5)], [0, 1, 2, 3, 4])
+
+    def test_worker_steals_from_other_shards(self):
+        queue = ShardedJobQueue(4, maxsize=100)
+        for item in range(20):
+            queue.put_nowait(item)
+        # Only shard 0 has a consumer; the other shards' jobs must be stolen
+        taken = sorted(queue.get(0, timeout=1) for _ in range(20))
+        self.assertEqual(taken, list(range(20)))
+        self.assertTrue(queue.empty())
+
+    def test_get_times_out_when_empty(self):
+        queue = ShardedJobQueue(2, maxsize=10)
+        start = time.monotonic()
+        with self.assertRaises(Empty):
+            queue.get(0, timeout=0.1)
+        self.assertGreaterEqual(time.monotonic() - start, 0.1)
+
+    def test_blocked_worker_wakes_for_job_on_another_shard(self):
+        queue = ShardedJobQueue(2, maxsize=10)
+        received = []
+        consumer = threading.Thread(
+            target=lambda: received.append(queue.get(1, timeout=5)), daemon=True
+        )
+        consumer.start()
+        time.sleep(0.1)
+        # Round-robin places the first job on shard 0, whose worker is absent
+        queue.put_nowait("job")
+        consumer.join(timeout=5)
+        self.assertFalse(consumer.is_alive())
+        self.assertEqual(received, ["job"])
+
+    def test_join_drains_with_concurrent_workers(self):
+        shard_count = 4
+        queue = ShardedJobQueue(shard_count, maxsize=10000)
+        done = []
+        done_lock = threading.Lock()
+
+        def worker(index):
+            while True:
+                item = queue.get(index)
+                try:
+                    if item == "stop":
+                        return
+                    with done_lock:
+                        done.append(item)
+                finally:
+                    queue.task_done()
+
+        # One shard has no worker, so its jobs are only ever stolen
+        workers = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(shard_count - 1)]
+        for thread in workers:
+            thread.start()
+        for item in range(3000):
+            queue.put_nowait(item)
+        queue.join()
+        self.assertEqual(sorted(done), list(range(3000)))
+
+        for _ in workers:
+            queue.put("stop")
+        for thread in workers:
+            thread.join(timeout=5)
+        self.assertFalse(any(thread.is_alive() for thread in workers))
+
+    def test_join_waits_for_job_put_while_draining(self):
+        queue = ShardedJobQueue(2, maxsize=10)
+        first_gate, late_gate = threading.Event(), threading.Event()
+
+        def worker():
+            while True:
+                gate = queue.get(0)
+                try:
+                    if gate == "stop":
+                        return
+                    gate.wait(timeout=5)
+                finally:
+                    queue.task_done()
+
+        consumer = threading.Thread(target=worker, daemon=True)
+        consumer.start()
+        queue.put_nowait(first_gate)
+        joiner = threading.Thread(target=queue.join, daemon=True)
+        joiner.start()
+        time.sleep(0.1)
+
+        # Put after join() started waiting, then let only the first job finish
+        queue.put_nowait(late_gate)
+        first_gate.set()
+        time.sleep(0.2)
+        self.assertTrue(joiner.is_alive(), "join returned with a job still pending")
+
+        late_gate.set()
+        joiner.join(timeout=5)
+        self.assertFalse(joiner.is_alive())
+        queue.put("stop")
+        consumer.join(timeout=5)
+
+    def test_join_returns_at_once_when_idle(self):
+        queue = ShardedJobQueue(2, maxsize=10)
+        queue.join()
+        queue.put_nowait("job")
+        queue.get(0)
+        queue.task_done()
+        queue.join()
+
+    def test_join_waits_again_after_a_previous_drain(self):
+        queue = ShardedJobQueue(1, maxsize=10)
+        queue.put_nowait("first")
+        queue.get(0)
+        queue.task_done()
+        queue.join()
+
+        queue.put_nowait("second")
+        joiner = threading.Thread(target=queue.join, daemon=True)
+        joiner.start()
+        joiner.join(timeout=0.2)
+        self.assertTrue(joiner.is_alive(), "join returned with a job still pending")
+
+        queue.get(0)
+        queue.task_done()
+        joiner.join(timeout=5)
+        self.assertFalse(joiner.is_alive())
+
+
+class TestThreadPool(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = ThreadPool(max_queue_size=2, persist_results=False)
+        self.gate = threading.Event()
+
+    def tearDown(self):
+        self.gate.set()
+        self.pool.shutdown()
+
+    def fill_queue(self):
+        """Block every worker and fill the queue, returning the rejected ID"""
+        for job_id in range(1, 100):
+            try:
+                self.pool.add_job(lambda _: self.gate.wait(timeout=5), None, job_id)
+            except QueueFullError:
+                return str(job_id)
+        self.fail("queue never reported full")
+        return None
+
+    def test_full_queue_rejects_and_releases_the_job_id(self):
+        rejected_id = self.fill_queue()
+        self.assertLessEqual(int(rejected_id) - 1, self.pool.num_threads + 2)
+        self.assertIsNone(self.pool.get_job_status(rejected_id))
+        self.assertNotIn(rejected_id, self.pool.job_records)
+
+        # Once the queue drains, the released ID can be submitted again
+        self.gate.set()
+        self.pool.job_queue.join()
+        self.pool.add_job(lambda payload: payload, "ok", rejected_id)
+        self.pool.job_queue.join()
+        self.assertEqual(self.pool.get_job_status(rejected_id), STATUS_DONE)
+        self.assertEqual(self.pool.get_job_result(rejected_id), "ok")
+
+
+class TestThreadPoolExecutor(unittest.TestCase):
+
+    def setUp(self):
+        self.executor = ThreadPoolExecutor(max_workers=2)
+        self.pool = ThreadPool(executor=self.executor, persist_results=False)
+
+    def tearDown(self):
+        self.pool.shutdown()
+        self.executor.shutdown()
+
+    def test_jobs_run_on_the_executor(self):
+        worker_names = []
+
+        def job(payload):
+            worker_names.append(threading.current_thread().name)
+            return payload * 2
+
+        self.pool.add_job(job, 21, 1)
+        self.pool.job_queue.join()
+        self.assertEqual(self.pool.get_job_status("1"), STATUS_DONE)
+        self.assertEqual(self.pool.get_job_result("1"), 42)
+        self.assertTrue(worker_names[0].startswith("ThreadPoolExecutor"))
+
+    def test_workers_are_not_pinned_with_an_executor(self):
+        self.assertTrue(all(worker.core_id is None for worker in self.pool.workers))
+        if not hasattr(os, "sched_getaffinity"):
+            return
+        # Executor threads start inside a worker's submit() and inherit its mask
+        self.pool.add_job(lambda _: os.sched_getaffinity(0), None, 3)
+        self.pool.job_queue.join()
+        self.assertEqual(self.pool.get_job_result("3"), os.sched_getaffinity(0))
+
+    def test_executor_errors_are_recorded(self):
+        def job(_):
+            raise ValueError("bad input")
+
+        self.pool.add_job(job, None, 2)
+        self.pool.job_queue.join()
+        self.assertEqual(self.pool.get_job_status("2"), STATUS_ERROR)
+        self.assertEqual(
+            self.pool.get_job_record("2").result, {"error": "bad input", "type": "ValueError"}
+        )
+
+
+class TestAsyncArtifactWriter(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_close_writes_pending_results_and_releases_resources(self):
+        writer = AsyncArtifactWriter(self.directory)
+        for job_id in range(5):
+            writer.submit(job_id, {"value": job_id})
+        writer.close()
+
+        self.assertFalse(writer.writer_thread.is_alive())
+        self.assertIsNone(writer.directory_fd)
+        self.assertEqual(len(os.listdir(self.directory)), 5)
+        with open(os.path.join(self.directory, "job_4.json"), encoding="utf-8") as result_file:
+            self.assertEqual(result_file.read(), '{"value":4}')
+        writer.close()  # A second close is a no-op
+
+    def test_flush_returns_when_the_writer_thread_died(self):
+        writer = AsyncArtifactWriter(self.directory)
+        with patch.object(writer, "_write_artifact", side_effect=RuntimeError("boom")), \
+                patch("threading.excepthook"):
+            writer.submit(1, {})
+            self.assertFalse(writer.flush())
+        self.assertFalse(writer.writer_thread.is_alive())
+        writer.close()
+
+    def test_pool_shutdown_closes_its_writer(self):
+        previous_directory = os.getcwd()
+        os.chdir(self.directory)
+        try:
+            pool = ThreadPool(persist_results=True)
+            pool.add_job(lambda payload: payload, {"ok": True}, 1)
+            pool.shutdown()
+        finally:
+            os.chdir(previous_directory)
+
+        self.assertFalse(pool.artifact_writer.writer_thread.is_alive())
+        self.assertIsNone(pool.artifact_writer.directory_fd)
+        self.assertTrue(os.path.exists(os.path.join(self.directory, "results", "job_1.json")))
+
+
+class TestWorkerLogging(unittest.TestCase):
+
+    def test_worker_records_reach_the_root_handlers(self):
+        received = []
+        arrived = threading.Event()
+
+        class Capture(logging.Handler):
+            def emit(self, record):
+                if record.name == "task_runner" and "capture-job" in record.getMessage():
+                    received.append(record)
+                    arrived.set()
+
+        capture = Capture()
+        logging.getLogger().addHandler(capture)
+        pool = ThreadPool(persist_results=False)
+        try:
+            pool.add_job(lambda payload: payload, None, "capture-job")
+            self.assertTrue(arrived.wait(timeout=5))
+        finally:
+            pool.shutdown()
+            logging.getLogger().removeHandler(capture)
+        self.assertEqual(received[0].name, "task_runner")
+
+
+if __name__ == "__main__":
+    unittest.main()